@@ -1,203 +1,400 @@
-import csv
+import asyncio
+import gzip
+import io
+import json
 import os
 import base64
 import time
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.subscription import SubscriptionClient
-from azure.mgmt.costmanagement import CostManagementClient
+import random
+import logging
+import string
+import pandas as pd
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline.policies import AsyncRetryPolicy
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.identity import TokenCachePersistenceOptions
+from azure.identity.aio import ClientSecretCredential, DefaultAzureCredential
+from azure.mgmt.subscription.aio import SubscriptionClient
+from azure.mgmt.costmanagement.aio import CostManagementClient
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
 
+try:
+    # Optional: decode Cost Management responses with orjson, which is a few
+    # times faster than the stdlib json the azure-core pipeline uses by
+    # default. The pipeline only calls loads on the response body; dumps and
+    # error handling stay on the stdlib module.
+    import orjson
+    from azure.core.pipeline.policies import _universal as _azure_universal
+
+    class _OrjsonShim:
+        loads = staticmethod(orjson.loads)
+        dumps = staticmethod(json.dumps)
+        JSONDecodeError = json.JSONDecodeError
+
+    _azure_universal.json = _OrjsonShim
+except ImportError:
+    pass
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+log = logging.getLogger("cost_report")
+
+# The email scaffolding never changes between runs, so it lives here as
+# plain strings; only the summary rows and the footer year are filled in
+# per send. string.Template keeps the literal CSS braces un-doubled.
+EMAIL_HEAD = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+            .container { max-width: 800px; margin: 0 auto; padding: 20px; }
+            .header { background-color: #0078d4; color: white; padding: 20px; text-align: center; }
+            .content { padding: 20px; background-color: #f9f9f9; }
+            .footer { text-align: center; padding: 20px; font-size: 12px; color: #666; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Azure Cost Report</h1>
+                <p>Pangea Production Environment</p>
+            </div>
+
+            <div class="content">
+                <p>Dear IT Admin,</p>
+                <p>Please find attached the Azure cost report for the last three months. This report provides a detailed breakdown of our cloud infrastructure costs across all the subscriptions.</p>
+                <table>
+                    <tr><th>Month</th><th>Total Cost</th></tr>
+"""
+
+EMAIL_TAIL = string.Template("""
+                </table>
+                <p>If you require any further details or have questions regarding this report, please contact the Production team.</p>
+                <p>Best regards,<br>
+                <strong>Platform Team</strong><br>
+                Pangea Technologies</p>
+            </div>
+
+            <div class="footer">
+                <p>This is an automated report. Please do not reply to this email.</p>
+                <p>© $year Pangea Technologies. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """)
+
+NAME_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "azure_cost_report", "sub_names.json")
+NAME_CACHE_TTL = 12 * 60 * 60  # display names change rarely; refresh every 12 hours
+GZIP_THRESHOLD = 64 * 1024  # gzip the attachment once the CSV outgrows 64KB
+
+def _load_name_cache():
+    try:
+        with open(NAME_CACHE_FILE) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_name_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(NAME_CACHE_FILE), exist_ok=True)
+        with open(NAME_CACHE_FILE, 'w') as f:
+            json.dump(cache, f)
+    except Exception as e:
+        log.warning(f"   Warning: could not save subscription name cache: {e}")
+
+_name_cache = _load_name_cache()
+
+async def get_display_name(subscription_client, sub_id):
+    entry = _name_cache.get(sub_id)
+    if entry and time.time() - entry.get("ts", 0) < NAME_CACHE_TTL:
+        return entry["name"]
+    sub = await subscription_client.subscriptions.get(subscription_id=sub_id)
+    _name_cache[sub_id] = {"name": sub.display_name, "ts": time.time()}
+    _save_name_cache(_name_cache)
+    return sub.display_name
+
+def get_credential():
+    tenant_id = os.getenv("AZURE_TENANT_ID")
+    client_id = os.getenv("AZURE_CLIENT_ID")
+    client_secret = os.getenv("AZURE_CLIENT_SECRET")
+    if tenant_id and client_id and client_secret:
+        # Go straight to the service principal instead of walking the
+        # DefaultAzureCredential probe chain, and persist the AAD token so
+        # back-to-back runs on the same host skip the token round-trip.
+        cache_options = TokenCachePersistenceOptions(name="azure_cost_report", allow_unencrypted_storage=True)
+        return ClientSecretCredential(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret,
+                                      cache_persistence_options=cache_options)
+    return DefaultAzureCredential()
+
 def get_last_three_full_months():
     today = datetime.now()
     month_data = []
     for i in range(3, 0, -1):
-        start_of_month = (today - relativedelta(months=i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_of_month = (start_of_month + relativedelta(months=1)) - timedelta(seconds=1)
-        month_name = start_of_month.strftime('%B %Y')
-        start_date_str = start_of_month.strftime('%Y-%m-%dT%H:%M:%SZ')
-        end_date_str = end_of_month.strftime('%Y-%m-%dT%H:%M:%SZ')
-        month_data.append({"name": month_name, "start": start_date_str, "end": end_date_str})
+        year, month = today.year, today.month - i
+        if month <= 0:
+            month += 12
+            year -= 1
+        next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+        last_day = (datetime(next_year, next_month, 1) - timedelta(days=1)).day
+        month_data.append({
+            "name": datetime(year, month, 1).strftime('%B %Y'),
+            "start": f"{year:04d}-{month:02d}-01T00:00:00Z",
+            "end": f"{year:04d}-{month:02d}-{last_day:02d}T23:59:59Z"
+        })
     return month_data
 
-def get_subscription_costs(cost_client, scope, start_date, end_date, max_retries=8):
+async def query_usage_with_retry(cost_client, scope, query_definition, max_retries=8):
+    last_error = None
     for attempt in range(max_retries):
         try:
-            query_definition = {
-                "type": "ActualCost",
-                "timeframe": "Custom",
-                "timePeriod": {"from": start_date, "to": end_date},
-                "dataset": {
-                    "granularity": "None",
-                    "aggregation": {
-                        "totalCost": {"name": "PreTaxCost", "function": "Sum"}
-                    }
-                }
-            }
-            query_result = cost_client.query.usage(scope=scope, parameters=query_definition)
-            if query_result.rows and len(query_result.rows) > 0:
-                return float(query_result.rows[0][0])
-            else:
-                print(f"   No cost data found for period {start_date} to {end_date}")
-                return 0.0
+            return await cost_client.query.usage(scope=scope, parameters=query_definition)
+        except HttpResponseError as e:
+            status = getattr(e, 'status_code', None)
+            if status != 429 and (status is None or status < 500):
+                raise
+            last_error = e
+            retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+            try:
+                # Honour the server-requested wait exactly.
+                wait_time = min(float(retry_after), 120)
+            except (TypeError, ValueError):
+                # Missing header, or an HTTP-date form we don't parse:
+                # exponential backoff with jitter so parallel workers don't
+                # all retry in lockstep.
+                wait_time = min(2 ** attempt, 60) + random.uniform(0, 1)
+            log.warning(f"   Throttled (HTTP {status}), retrying after {wait_time:.1f} seconds (attempt {attempt + 1})...")
+            await asyncio.sleep(wait_time)
+    raise last_error
+
+async def get_monthly_costs(cost_client, scope, start_date, end_date):
+    query_definition = {
+        "type": "ActualCost",
+        "timeframe": "Custom",
+        "timePeriod": {"from": start_date, "to": end_date},
+        "dataset": {
+            "granularity": "Monthly",
+            "aggregation": {
+                "totalCost": {"name": "PreTaxCost", "function": "Sum"}
+            },
+            "grouping": [
+                {"type": "Dimension", "name": "BillingMonth"}
+            ]
+        }
+    }
+    try:
+        query_result = await query_usage_with_retry(cost_client, scope, query_definition)
+    except Exception as e:
+        log.error(f"   Error fetching cost data for period {start_date} to {end_date}: {e}")
+        return {}
+    columns = [column.name for column in query_result.columns or []]
+    cost_idx = columns.index('PreTaxCost') if 'PreTaxCost' in columns else 0
+    month_idx = columns.index('BillingMonth') if 'BillingMonth' in columns else 1
+    monthly_costs = {}
+    for row in query_result.rows or []:
+        # The date column comes back either as 20250601 or as an ISO
+        # timestamp depending on the API version.
+        date_str = str(row[month_idx]).split('T')[0].replace('-', '')
+        month_name = datetime.strptime(date_str, '%Y%m%d').strftime('%B %Y')
+        monthly_costs[month_name] = monthly_costs.get(month_name, 0.0) + float(row[cost_idx])
+    if not monthly_costs:
+        log.debug(f"   No cost data found for period {start_date} to {end_date}")
+    return monthly_costs
+
+async def get_all_subscription_costs(cost_client, billing_scope, start_date, end_date):
+    query_definition = {
+        "type": "ActualCost",
+        "timeframe": "Custom",
+        "timePeriod": {"from": start_date, "to": end_date},
+        "dataset": {
+            "granularity": "Monthly",
+            "aggregation": {
+                "totalCost": {"name": "PreTaxCost", "function": "Sum"}
+            },
+            "grouping": [
+                {"type": "Dimension", "name": "SubscriptionId"},
+                {"type": "Dimension", "name": "BillingMonth"}
+            ]
+        }
+    }
+    try:
+        query_result = await query_usage_with_retry(cost_client, billing_scope, query_definition)
+    except Exception as e:
+        # None signals "query failed" so the caller can fall back to the
+        # per-subscription path; {} is reserved for a genuinely empty result.
+        log.error(f"   Error fetching cost data for scope {billing_scope}: {e}")
+        return None
+    columns = [column.name for column in query_result.columns or []]
+    cost_idx = columns.index('PreTaxCost') if 'PreTaxCost' in columns else 0
+    month_idx = columns.index('BillingMonth') if 'BillingMonth' in columns else 1
+    sub_idx = columns.index('SubscriptionId') if 'SubscriptionId' in columns else 2
+    cost_map = {}
+    for row in query_result.rows or []:
+        date_str = str(row[month_idx]).split('T')[0].replace('-', '')
+        month_name = datetime.strptime(date_str, '%Y%m%d').strftime('%B %Y')
+        key = (str(row[sub_idx]).lower(), month_name)
+        cost_map[key] = cost_map.get(key, 0.0) + float(row[cost_idx])
+    if not cost_map:
+        log.debug(f"   No cost data found for scope {billing_scope}")
+    return cost_map
+
+async def process_subscription(sub_id, scope, months, cost_client, subscription_client, semaphore, monthly_costs=None):
+    async with semaphore:
+        try:
+            display_name = await get_display_name(subscription_client, sub_id)
+            log.debug(f"-> Processing subscription: {display_name} ({sub_id})")
         except Exception as e:
-            if '429' in str(e):
-                wait_time = min(2 ** attempt, 60)  # cap wait_time to max 60 seconds
-                print(f"   Rate limited, retrying after {wait_time} seconds (attempt {attempt + 1})...")
-                time.sleep(wait_time)
-            else:
-                print(f"   Error fetching cost data: {e}")
-                break
-    print(f"   Failed to fetch cost data for period {start_date} to {end_date} after {max_retries} retries.")
-    return 0.0
-
-def generate_cost_report():
+            log.error(f"-> Error fetching details for subscription ID: {sub_id}. Details: {e}")
+            return None
+        if monthly_costs is None:
+            # One Monthly-granularity query covers the whole reporting window,
+            # instead of a separate request per month.
+            monthly_costs = await get_monthly_costs(cost_client, scope, months[0]['start'], months[-1]['end'])
+    records = []
+    for month in months:
+        name = month['name']
+        cost = monthly_costs.get(name, 0.0)
+        records.append((sub_id, name, cost))
+        log.debug(f"   Cost for {name}: ₹{cost:.2f} INR")
+    return (sub_id, display_name, records)
+
+async def generate_cost_report():
     subscription_ids_str = os.getenv("SUBSCRIPTION_IDS")
     if not subscription_ids_str:
-        print("Error: SUBSCRIPTION_IDS environment variable is not set.")
-        return None, None
+        log.error("Error: SUBSCRIPTION_IDS environment variable is not set.")
+        return None, None, None
         
     target_subscription_ids = [sub.strip() for sub in subscription_ids_str.split(',') if sub.strip()]
     if not target_subscription_ids:
-        print("Please add at least one subscription ID to the 'SUBSCRIPTION_IDS' environment variable.")
-        return None, None
-    print("Authenticating with Azure via Service Principal...")
+        log.error("Please add at least one subscription ID to the 'SUBSCRIPTION_IDS' environment variable.")
+        return None, None, None
+    log.info("Authenticating with Azure via Service Principal...")
     try:
-        credential = DefaultAzureCredential()
-        token = credential.get_token("https://management.azure.com/.default")
-        print("Authentication successful.")
+        # The SDK clients acquire and cache a token lazily on first use;
+        # auth failures surface on the first real call instead.
+        credential = get_credential()
     except Exception as e:
-        print(f"Authentication failed. Please ensure you have configured credentials. Error: {e}")
-        return None, None
-    subscription_client = SubscriptionClient(credential)
-    cost_client = CostManagementClient(credential)
+        log.error(f"Authentication failed. Please ensure you have configured credentials. Error: {e}")
+        return None, None, None
+    # Share one transport (and its keep-alive connection pool) between both
+    # clients so the concurrent tasks reuse sockets instead of re-doing TLS
+    # handshakes against management.azure.com.
+    transport = AioHttpTransport()
+    retry_policy = AsyncRetryPolicy(retry_total=8, retry_backoff_factor=2.0, retry_backoff_max=120,
+                                    retry_on_status_codes=[429, 500, 502, 503, 504])
     months = get_last_three_full_months()
-    
-    print(f"\nGenerating cost report for the following subscriptions: {target_subscription_ids}")
-    print(f"Reporting period: {months[0]['name']} to {months[-1]['name']}\n")
-    report_data = []
-    summary_data = {}
-    avg_data = {}
-    for sub_id in target_subscription_ids:
-        report_row = {'Subscription ID': sub_id}
-        month_costs = []
-        try:
-            sub = subscription_client.subscriptions.get(subscription_id=sub_id)
-            report_row['Subscription Name'] = sub.display_name
-            print(f"-> Processing subscription: {sub.display_name} ({sub_id})")
-        except Exception as e:
-            report_row['Subscription Name'] = "N/A"
-            print(f"-> Error fetching details for subscription ID: {sub_id}. Details: {e}")
+
+    log.info(f"\nGenerating cost report for the following subscriptions: {target_subscription_ids}")
+    log.info(f"Reporting period: {months[0]['name']} to {months[-1]['name']}\n")
+    async with credential, \
+            SubscriptionClient(credential, transport=transport) as subscription_client, \
+            CostManagementClient(credential, transport=transport, retry_policy=retry_policy) as cost_client:
+        # With a billing-account or management-group scope configured, all
+        # subscriptions are covered by one query instead of one per subscription.
+        period_start, period_end = months[0]['start'], months[-1]['end']
+        billing_scope = os.getenv("BILLING_SCOPE")
+        cost_map = None
+        if billing_scope:
+            log.info(f"Querying all subscription costs via billing scope: {billing_scope}")
+            cost_map = await get_all_subscription_costs(cost_client, billing_scope, period_start, period_end)
+            if cost_map is None:
+                log.warning("Billing scope query failed; falling back to per-subscription queries.")
+        # Bound concurrency so a large subscription list doesn't trip the
+        # tenant-level rate limits the retries would then have to absorb.
+        semaphore = asyncio.Semaphore(16)
+        # Pre-compute the per-subscription scopes once before the fan-out.
+        sub_scopes = [(sub_id, f"/subscriptions/{sub_id}") for sub_id in target_subscription_ids]
+        tasks = []
+        for sub_id, scope in sub_scopes:
+            monthly_costs = None
+            if cost_map is not None:
+                sub_key = sub_id.lower()
+                monthly_costs = {month['name']: cost_map.get((sub_key, month['name']), 0.0)
+                                 for month in months}
+            tasks.append(process_subscription(sub_id, scope, months, cost_client, subscription_client, semaphore, monthly_costs))
+        task_results = await asyncio.gather(*tasks)
+    # Pivot the (subscription, month, cost) records in one vectorized pass
+    # instead of assembling rows cell by cell in Python.
+    records = []
+    name_map = {}
+    for result in task_results:
+        if result is None:
             continue
-        for month in months:
-            try:
-                scope = f"/subscriptions/{sub_id}"
-                cost = get_subscription_costs(cost_client, scope, month['start'], month['end'])
-                report_row[month['name']] = cost
-                month_costs.append(cost)
-                print(f"   Cost for {month['name']}: ₹{cost:.2f} INR")
-                if month['name'] not in summary_data:
-                    summary_data[month['name']] = 0
-                summary_data[month['name']] += cost
-                time.sleep(2)  # delay to reduce rate limit risk
-            except Exception as e:
-                print(f"   Error fetching cost for {month['name']}. Details: {e}")
-                report_row[month['name']] = 'N/A'
-                month_costs.append(0.0)
-        # Calculate 3 month average
-        avg_cost = sum(month_costs) / len(month_costs) if month_costs else 0
-        report_row["3 Month Avg"] = avg_cost
-        avg_data[sub_id] = avg_cost
-        print(f"   3 Month Avg: ₹{avg_cost:.2f} INR")
-        report_data.append(report_row)
+        sub_id, display_name, sub_records = result
+        name_map[sub_id] = display_name
+        records.extend(sub_records)
+    month_names = [m['name'] for m in months]
+    df = pd.DataFrame.from_records(records, columns=["SubscriptionId", "Month", "Cost"])
+    pivot = df.pivot_table(index="SubscriptionId", columns="Month", values="Cost",
+                           aggfunc="sum", fill_value=0.0)
+    # Restore the configured subscription order and the calendar month order.
+    pivot = pivot.reindex(index=[s for s in target_subscription_ids if s in name_map],
+                          columns=month_names, fill_value=0.0)
+    pivot.index.name = 'Subscription ID'
+    pivot.insert(0, 'Subscription Name', pivot.index.map(name_map))
+    pivot["3 Month Avg"] = pivot[month_names].mean(axis=1)
+    summary_data = pivot[month_names].sum(axis=0).to_dict()
+    avg_data = pivot["3 Month Avg"].to_dict()
     file_name = f"azure_cost_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     try:
-        fieldnames = ['Subscription ID', 'Subscription Name'] + [m['name'] for m in months] + ["3 Month Avg"]
-        with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(report_data)
-        print(f"\nCost report successfully saved to {file_name}")
-        print("\nSummary:")
+        # Render the CSV into memory once; the email attachment is encoded
+        # straight from this buffer instead of re-reading the file from disk.
+        csv_buffer = io.BytesIO()
+        text_stream = io.TextIOWrapper(csv_buffer, newline='', encoding='utf-8')
+        pivot.to_csv(text_stream)
+        text_stream.detach()
+        with open(file_name, 'wb', buffering=1 << 20) as csvfile:
+            csvfile.write(csv_buffer.getbuffer())
+        log.info(f"\nCost report successfully saved to {file_name}")
+        log.info("\nSummary:")
         for month_name, total_cost in summary_data.items():
-            print(f"Total for {month_name}: ₹{total_cost:.2f} INR")
-        print("3 Month Average by subscription:")
+            log.info(f"Total for {month_name}: ₹{total_cost:.2f} INR")
+        log.info("3 Month Average by subscription:")
         for sub_id, avg_cost in avg_data.items():
-            print(f"{sub_id}: ₹{avg_cost:.2f} INR")
-        return file_name, summary_data
+            log.info(f"{sub_id}: ₹{avg_cost:.2f} INR")
+        return file_name, csv_buffer, summary_data
     except PermissionError:
-        print(f"\nPermission Denied: Could not write to '{file_name}'.")
-        print("Please ensure the file is not open in another program (like Excel) and that you have write permissions for this directory.")
-        return None, None
+        log.error(f"\nPermission Denied: Could not write to '{file_name}'.")
+        log.error("Please ensure the file is not open in another program (like Excel) and that you have write permissions for this directory.")
+        return None, None, None
     except Exception as e:
-        print(f"\nAn unexpected error occurred while writing the file: {e}")
-        return None, None
+        log.error(f"\nAn unexpected error occurred while writing the file: {e}")
+        return None, None, None
 
-def send_email_with_attachment(csv_file_path, summary_data):
+def send_email_with_attachment(csv_file_path, csv_buffer, summary_data):
     sendgrid_api_key = os.getenv("SENDGRID_API_KEY")
     sender_email = os.getenv("SENDER_EMAIL")
     receiver_emails_str = os.getenv("RECEIVER_EMAILS")
     
     if not sendgrid_api_key or not sender_email or not receiver_emails_str:
-        print("Error: Missing required SendGrid or email environment variables.")
+        log.error("Error: Missing required SendGrid or email environment variables.")
         return False
         
     to_emails = [email.strip() for email in receiver_emails_str.split(',') if email.strip()]
     if not to_emails:
-        print("Error: No receiver emails found in RECEIVER_EMAILS environment variable.")
-        return False
-    
-    try:
-        with open(csv_file_path, 'rb') as f:
-            csv_data = f.read()
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
+        log.error("Error: No receiver emails found in RECEIVER_EMAILS environment variable.")
         return False
     
-    subject = f"Azure Cost Report - {datetime.now().strftime('%B %Y')}"
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ max-width: 800px; margin: 0 auto; padding: 20px; }}
-            .header {{ background-color: #0078d4; color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; background-color: #f9f9f9; }}
-            .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #666; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Azure Cost Report</h1>
-                <p>Pangea Production Environment</p>
-            </div>
-            
-            <div class="content">
-                <p>Dear IT Admin,</p>
-                <p>Please find attached the Azure cost report for the last three months. This report provides a detailed breakdown of our cloud infrastructure costs across all the subscriptions.</p>
-                <p>If you require any further details or have questions regarding this report, please contact the Production team.</p>
-                <p>Best regards,<br>
-                <strong>Platform Team</strong><br>
-                Pangea Technologies</p>
-            </div>
-            
-            <div class="footer">
-                <p>This is an automated report. Please do not reply to this email.</p>
-                <p>© {datetime.now().year} Pangea Technologies. All rights reserved.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    now = datetime.now()
+    subject = f"Azure Cost Report - {now.strftime('%B %Y')}"
+
+    # Join the summary rows in one pass instead of growing a string with +=.
+    summary_rows = "".join(
+        f"<tr><td>{month_name}</td><td>₹{total_cost:,.2f} INR</td></tr>"
+        for month_name, total_cost in summary_data.items()
+    )
+    html_content = EMAIL_HEAD + summary_rows + EMAIL_TAIL.substitute(year=now.year)
+    summary_lines = "\n".join(
+        f"Total for {month_name}: ₹{total_cost:,.2f} INR"
+        for month_name, total_cost in summary_data.items()
+    )
     text_content = f"""
 Azure Cost Report - Pangea Production Environment
 Dear IT Admin,
 Please find attached the Azure cost report for the last three months providing a detailed cost breakdown across all subscriptions.
+{summary_lines}
 If you have questions or require further details, please contact the Platform team.
 Best regards,
 Platform Team
@@ -211,34 +408,44 @@ Pangea Technologies
             html_content=html_content,
             plain_text_content=text_content
         )
-        encoded_file = base64.b64encode(csv_data).decode()
+        # getbuffer() hands gzip/b64encode a view of the CSV bytes without copying.
+        csv_bytes = csv_buffer.getbuffer()
+        attachment_name = os.path.basename(csv_file_path)
+        file_type = 'text/csv'
+        if csv_bytes.nbytes > GZIP_THRESHOLD:
+            # Large reports: compress before the base64 step so both the
+            # encoding work and the SendGrid payload shrink with it.
+            csv_bytes = gzip.compress(csv_bytes, compresslevel=6)
+            attachment_name += '.gz'
+            file_type = 'application/gzip'
+        encoded_file = base64.b64encode(csv_bytes).decode('ascii')
         attachment = Attachment(
             FileContent(encoded_file),
-            FileName(os.path.basename(csv_file_path)),
-            FileType('text/csv'),
+            FileName(attachment_name),
+            FileType(file_type),
             Disposition('attachment')
         )
         message.attachment = attachment
         sg = SendGridAPIClient(sendgrid_api_key)
         response = sg.send(message)
         
-        print(f"Email sent successfully! Status Code: {response.status_code}")
+        log.info(f"Email sent successfully! Status Code: {response.status_code}")
         return True
         
     except Exception as e:
-        print(f"Error sending email: {e}")
+        log.error(f"Error sending email: {e}")
         return False
 
-def main():
+async def main():
     print("Starting Azure Cost Report Generation...")
     print("=" * 50)
-    
-    csv_file, summary_data = generate_cost_report()
-    
+
+    csv_file, csv_buffer, summary_data = await generate_cost_report()
+
     if csv_file and summary_data:
         print("\n" + "=" * 50)
         print("Sending email with cost report...")
-        success = send_email_with_attachment(csv_file, summary_data)
+        success = send_email_with_attachment(csv_file, csv_buffer, summary_data)
         if success:
             print("✅ Process completed successfully!")
             print(f"📊 Report generated: {csv_file}")
@@ -248,4 +455,4 @@ def main():
     else:
         print("❌ Failed to generate cost report.")
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())